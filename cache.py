@@ -5,12 +5,478 @@
 import math
 from binascii import hexlify
 from os import urandom
+import argparse
+import contextlib
 import csv
+import hashlib
+import json
+import marshal
+import multiprocessing
+import os
 import random
+import sys
+import time
+from collections import OrderedDict, deque
 
-class CACHE:
+try:
+  import resource
+except ImportError:  # not available on Windows
+  resource = None
+
+
+def source_version(release='1.1.0'):
+  """Release number tagged with a hash of this file's source, so results
+  from an edited simulator never share a sim_version with the original."""
+  with open(os.path.abspath(__file__), 'rb') as f:
+    return '{}+{}'.format(release, hashlib.sha256(f.read()).hexdigest()[:12])
+
+__version__ = source_version()
+
+
+class RUN_CONTEXT:
+  def __init__(self, seed=None):
+    """Creates a run context that seeds every random source of a simulation.
+    Child contexts derived with spawn() get independent streams that depend
+    only on the master seed and their key, so a config produces the same
+    numbers whether it runs serially or in a parallel worker.
+    :param int seed: Master seed. A random one is drawn (and recorded) if None.
+
+    """
+    if seed is None:
+      seed = int.from_bytes(urandom(8), 'big')
+    self.seed = seed
+    self.trace_hash = hashlib.blake2b(digest_size=8)
+
+  def derive(self, *key):
+    """Derives a 64-bit seed from the master seed and a key."""
+    h = hashlib.sha256(repr((self.seed,) + key).encode())
+    return int.from_bytes(h.digest()[:8], 'big')
+
+  def spawn(self, *key):
+    """Returns an independent child context for key, e.g. (cache_size, block_size)."""
+    return RUN_CONTEXT(self.derive('spawn', *key))
+
+  def stream(self, *key):
+    """Returns a seeded random.Random for one random source, e.g. 'workload'."""
+    return random.Random(self.derive('stream', *key))
+
+  def memory_bytes(self, size):
+    """Generates size bytes of reproducible backing memory contents."""
+    rng = self.stream('memory')
+    chunk = 1 << 20
+    memory = bytearray()
+    while len(memory) < size:
+      memory += rng.randbytes(min(chunk, size - len(memory)))
+    return memory
+
+  def record(self, address):
+    """Adds an accessed address to the trace fingerprint."""
+    self.trace_hash.update(address.to_bytes(8, 'little'))
+
+  def fingerprint(self):
+    """Hex digest of every address recorded so far."""
+    return self.trace_hash.hexdigest()
+
+def current_rss():
+  """Current resident set size in bytes, or None where /proc is unavailable."""
+  try:
+    with open('/proc/self/statm') as f:
+      return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+  except (OSError, ValueError, IndexError):
+    return None
+
+def peak_rss():
+  """Peak resident set size in bytes, or None without the resource module."""
+  if resource is None:
+    return None
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # ru_maxrss is in bytes on macOS, KiB elsewhere
+  return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class SIM_PROFILER:
+  def __init__(self, sample_every=1, snapshot_every=100000):
+    """Creates a low-overhead phase profiler for the simulator hot path.
+    Only every sample_every-th access (and the phases nested in it) is timed;
+    totals are scaled back up by the sampling factor when exported.
+    :param int sample_every: Time one access out of this many.
+    :param int snapshot_every: Accesses between throughput/memory snapshots.
+
+    """
+    if sample_every < 1 or snapshot_every < 1:
+      raise ValueError("sample_every and snapshot_every must be at least 1")
+    self.sample_every = sample_every
+    self.snapshot_every = snapshot_every
+    # (file, line, name) -> [calls, inclusive ns, exclusive ns, sampled?, callers]
+    self.phases = {}
+    # open phases: [key, child ns]
+    self.stack = []
+    self.timeline = []
+
+    # counters
+    self.counter_accesses = 0
+    self.counter_sampled = 0
+
+    self.start = time.perf_counter()
+    self.last_snapshot = (self.start, 0)
+
+  def wrap(self, name, func, access=False):
+    """Returns func timed as phase name.
+    Access phases (read/write) count accesses and pick which are sampled;
+    other phases are timed only when nested inside a sampled access.
+    """
+    code = getattr(func, '__code__', None)
+    if code is None:
+      key = ('~', 0, name)
+    else:
+      key = (code.co_filename, code.co_firstlineno, name)
+
+    # per-phase call count, so interleaved reads and writes are both sampled
+    calls = [0]
+
+    def timed(*args):
+      if access:
+        self.counter_accesses += 1
+        if self.counter_accesses % self.snapshot_every == 0:
+          self.snapshot()
+        calls[0] += 1
+        if calls[0] % self.sample_every:
+          return func(*args)
+        self.counter_sampled += 1
+      elif not self.stack:
+        return func(*args)
+      return self._timed(key, func, args, True)
+    return timed
+
+  @contextlib.contextmanager
+  def phase(self, name):
+    """Context manager timing one unsampled phase, e.g. result I/O."""
+    self.stack.append([('~', 0, name), 0])
+    t0 = time.perf_counter_ns()
+    try:
+      yield
+    finally:
+      self._close(time.perf_counter_ns() - t0, False)
+
+  def _timed(self, key, func, args, sampled):
+    self.stack.append([key, 0])
+    t0 = time.perf_counter_ns()
+    try:
+      return func(*args)
+    finally:
+      self._close(time.perf_counter_ns() - t0, sampled)
+
+  def _close(self, elapsed, sampled):
+    key, child = self.stack.pop()
+    entry = self.phases.setdefault(key, [0, 0, 0, sampled, {}])
+    entry[0] += 1
+    entry[1] += elapsed
+    entry[2] += elapsed - child
+    if self.stack:
+      parent = self.stack[-1]
+      parent[1] += elapsed
+      entry[4][parent[0]] = entry[4].get(parent[0], 0) + 1
+
+  def snapshot(self):
+    """Records throughput since the last snapshot and current memory usage."""
+    now = time.perf_counter()
+    last_time, last_accesses = self.last_snapshot
+    elapsed = now - last_time
+    rate = (self.counter_accesses - last_accesses) / elapsed if elapsed > 0 else 0.0
+    self.timeline.append({
+      'time_s': now - self.start,
+      'accesses': self.counter_accesses,
+      'accesses_per_s': rate,
+      'rss_bytes': current_rss(),
+      'peak_rss_bytes': peak_rss(),
+    })
+    self.last_snapshot = (now, self.counter_accesses)
+
+  def scale(self):
+    """Factor from sampled to estimated full-run phase totals."""
+    if self.counter_sampled == 0:
+      return 1.0
+    return self.counter_accesses / self.counter_sampled
+
+  def stats(self):
+    """Phase totals as a pstats-compatible dict, times in seconds."""
+    factor = self.scale()
+    stats = {}
+    for key, (calls, inclusive, exclusive, sampled, callers) in self.phases.items():
+      f = factor if sampled else 1.0
+      nc = int(round(calls * f))
+      stats[key] = (nc, nc, exclusive * f / 1e9, inclusive * f / 1e9,
+                    {caller: int(round(n * f)) for caller, n in callers.items()})
+    return stats
+
+  def dump_stats(self, path):
+    """Writes phase totals in the cProfile format, readable by pstats.Stats(path)."""
+    with open(path, 'wb') as f:
+      marshal.dump(self.stats(), f)
+
+  def write_timeline(self, path):
+    """Writes phase totals and throughput snapshots as JSON."""
+    self.snapshot()
+    phases = {}
+    for key, (nc, cc, tt, ct, callers) in self.stats().items():
+      phases[key[2]] = {'calls': nc, 'total_s': ct, 'self_s': tt}
+    with open(path, 'w') as f:
+      json.dump({
+        'sample_every': self.sample_every,
+        'accesses': self.counter_accesses,
+        'sampled_accesses': self.counter_sampled,
+        'phases': phases,
+        'snapshots': self.timeline,
+      }, f, indent=2)
+
+
+class VICTIM_CACHE:
+  def __init__(self, entries=4, replacement='LRU', is_debug=False):
+    """Creates a small fully-associative victim cache (Jouppi, 1990).
+    Holds blocks recently evicted from the primary cache, by reads or writes;
+    a primary read miss that hits here moves the block back up.
+    :param int entries: Number of blocks held.
+    :param str replacement: Replacement policy, 'LRU' or 'random'.
+    :param bool is_debug: Debugging enabled?
+
+    """
+    self.debug = is_debug
+    self.entries = entries
+    self.replacement = replacement
+    # block address -> None, least recently used first
+    self.blocks = OrderedDict()
+    # replaced by a stream of the owning cache's run context on attach()
+    self.rng = random.Random(0)
+
+    # counters
+    self.counter_lookups = 0
+    self.counter_hits = 0
+    self.counter_misses = 0
+    self.counter_prefetches = 0
+
+  def lookup(self, block):
+    """Probes for block after a primary read miss.
+    Returns True if block was found.
+    :param int block: Missing block address.
+
+    """
+    self.counter_lookups += 1
+    hit = block in self.blocks
+    if hit:
+      # block moves up into the primary cache
+      del self.blocks[block]
+      self.counter_hits += 1
+    else:
+      self.counter_misses += 1
+    if self.debug:
+      print("Victim Cache: {} = {}".format(hex(block), "Hit" if hit else "Miss"))
+    return hit
+
+  def evicted(self, block):
+    """Stores a block evicted from the primary cache."""
+    self.insert(block)
+
+  def insert(self, block):
+    """Inserts block as most recently used, evicting one block if full."""
+    if self.entries == 0:
+      return
+    self.blocks[block] = None
+    self.blocks.move_to_end(block)
+    if len(self.blocks) > self.entries:
+      if self.replacement == 'random':
+        # never evict the block just inserted
+        candidates = list(self.blocks)[:-1]
+        del self.blocks[self.rng.choice(candidates)]
+      else:
+        self.blocks.popitem(last=False)
+
+  def stats(self):
+    """Auxiliary structure counter statistics."""
+    return ([
+      'victim', self.entries,
+      self.counter_lookups, self.counter_hits,
+      self.counter_misses, self.counter_prefetches
+    ])
+
+
+class MISS_CACHE(VICTIM_CACHE):
+  def __init__(self, entries=4, replacement='LRU', is_debug=False):
+    """Creates a small fully-associative miss cache (Jouppi, 1990).
+    Every block that misses in the primary cache is also placed here, so a
+    later conflict on the same block can be served without going to memory.
+    :param int entries: Number of blocks held.
+    :param str replacement: Replacement policy, 'LRU' or 'random'.
+    :param bool is_debug: Debugging enabled?
+
+    """
+    super().__init__(entries, replacement, is_debug)
+
+  def lookup(self, block):
+    """Probes for block after a primary read miss, filling it on a miss.
+    Returns True if block was found.
+    :param int block: Missing block address.
+
+    """
+    self.counter_lookups += 1
+    hit = block in self.blocks
+    if hit:
+      self.counter_hits += 1
+    else:
+      self.counter_misses += 1
+    if self.debug:
+      print("Miss Cache: {} = {}".format(hex(block), "Hit" if hit else "Miss"))
+
+    self.insert(block)
+    return hit
+
+  def evicted(self, block):
+    """Ignored, miss caches hold the missing block instead of the victim."""
+
+  def stats(self):
+    """Auxiliary structure counter statistics."""
+    return ['miss'] + super().stats()[1:]
+
+
+class STREAM_BUFFER:
+  def __init__(self, buffers=1, depth=4, is_debug=False):
+    """Creates one or more sequential stream buffers (Jouppi, 1990).
+    On a primary miss that does not match any buffer head, the least recently
+    used buffer is flushed and refilled with the next depth blocks.
+    :param int buffers: Number of stream buffers (ways).
+    :param int depth: Blocks prefetched per buffer.
+    :param bool is_debug: Debugging enabled?
+
+    """
+    self.debug = is_debug
+    self.buffers = [deque() for x in range(0, buffers)]
+    self.depth = depth
+    # buffer numbers, least recently used first
+    self.lru = list(range(0, buffers))
+
+    # counters
+    self.counter_lookups = 0
+    self.counter_hits = 0
+    self.counter_misses = 0
+    self.counter_prefetches = 0
+
+  def lookup(self, block):
+    """Compares block against every buffer head after a primary read miss.
+    Returns True if block was found.
+    :param int block: Missing block address.
+
+    """
+    self.counter_lookups += 1
+    for num, buf in enumerate(self.buffers):
+      if buf and buf[0] == block:
+        # shift the head into the primary cache, prefetch one more
+        buf.popleft()
+        buf.append((buf[-1] if buf else block) + 1)
+        self.counter_prefetches += 1
+        self.counter_hits += 1
+        self.lru.remove(num)
+        self.lru.append(num)
+        if self.debug:
+          print("Stream Buffer {}: {} = Hit".format(num, hex(block)))
+        return True
+
+    self.counter_misses += 1
+    if self.debug:
+      print("Stream Buffer: {} = Miss".format(hex(block)))
+    if self.buffers:
+      num = self.lru.pop(0)
+      self.lru.append(num)
+      self.buffers[num] = deque(range(block + 1, block + 1 + self.depth))
+      self.counter_prefetches += self.depth
+    return False
+
+  def evicted(self, block):
+    """Ignored, stream buffers only prefetch."""
+
+  def stats(self):
+    """Auxiliary structure counter statistics."""
+    return ([
+      'stream', len(self.buffers) * self.depth,
+      self.counter_lookups, self.counter_hits,
+      self.counter_misses, self.counter_prefetches
+    ])
+
+
+class BASE_CACHE:
+  """Auxiliary-structure and profiler plumbing shared by every cache organisation.
+  Subclasses set self.ctx, self.aux and self.counter_aux_hits and implement
+  read, write and the PROFILED_PHASES methods.
+  """
+  # SIM_PROFILER, see enable_profiler(). A class attribute, not set in
+  # __init__: a 30th CACHE instance attribute stops CPython 3.11 from
+  # specialising the attribute loads in read() and write() (~6% slower).
+  profiler = None
+
+  # hot-path methods timed by enable_profiler(), besides read and write
+  PROFILED_PHASES = ('split_tio', 'replace_line', 'probe_aux', 'evict_aux', 'fill_block')
+
+  def attach(self, aux):
+    """Attaches an auxiliary structure (victim cache, miss cache or stream buffer).
+    :param aux: Object with lookup(block), evicted(block) and stats() methods.
+
+    """
+    # give each structure its own reproducible replacement stream
+    aux.rng = self.ctx.stream('replacement', len(self.aux))
+    self.aux.append(aux)
+    return aux
+
+  def probe_aux(self, block):
+    """Probes the attached auxiliary structures on a primary read miss.
+    Returns True if any structure held the block.
+    :param int block: Missing block address.
+
+    """
+    hit = False
+    for aux in self.aux:
+      if aux.lookup(block):
+        hit = True
+    if hit:
+      self.counter_aux_hits += 1
+    return hit
+
+  def evict_aux(self, victim):
+    """Hands a block evicted by a read or write miss to the auxiliary structures.
+    Call after probe_aux, so a full victim cache cannot drop the block being
+    probed for.
+    :param int victim: Evicted block address.
+
+    """
+    for aux in self.aux:
+      aux.evicted(victim)
+
+  def aux_stats(self):
+    """Counter statistics of every attached auxiliary structure."""
+    return [aux.stats() for aux in self.aux]
+
+  # profiling
+  def enable_profiler(self, profiler):
+    """Starts timing the hot-path phases with a SIM_PROFILER.
+    The timed wrappers shadow the methods on this instance only, so a cache
+    without a profiler runs the plain methods; its only added cost is the
+    self.profiler check that keeps the fill loop inline in read() and write().
+    """
+    self.profiler = profiler
+    prefix = type(self).__name__ + '.'
+    self.read = profiler.wrap(prefix + 'read', self.read, access=True)
+    self.write = profiler.wrap(prefix + 'write', self.write, access=True)
+    for name in self.PROFILED_PHASES:
+      setattr(self, name, profiler.wrap(prefix + name, getattr(self, name)))
+    return profiler
+
+  def disable_profiler(self):
+    """Restores the untimed methods."""
+    for name in ('read', 'write') + self.PROFILED_PHASES:
+      self.__dict__.pop(name, None)
+    self.__dict__.pop('profiler', None)
+
+
+class CACHE(BASE_CACHE):
   def __init__(self, addr_width, cache_size, block_size, assoc = 1, replacement='LRU',
-               is_debug=True):
+               is_debug=True, ctx=None):
     """Creates a new cache object. 
     :param int addr_width: Address width, in bits.
     :param int cache_size: Size of cache object, in bytes.
@@ -18,9 +484,11 @@ class CACHE:
     :param int assoc: Associativity
     :param str replacement: Cache replacement policy.
     :param bool is_debug: Debugging enabled?
+    :param RUN_CONTEXT ctx: Seeds memory contents and replacement, new seed if None.
 
     """
     self.debug = is_debug
+    self.ctx = ctx if ctx is not None else RUN_CONTEXT()
     self.addr_width = addr_width
     self.size = cache_size
     self.block_size = block_size
@@ -43,7 +511,7 @@ class CACHE:
     self.set_shift = int(math.log(self.block_size, 2))
 
     # Build physical memory, randomly generate values in physical memory
-    self.memory = bytearray(urandom(self.size ** 2))
+    self.memory = self.ctx.memory_bytes(self.size ** 2)
 
     # Build cache
     self.lines = int(self.size/self.block_size)
@@ -67,6 +535,10 @@ class CACHE:
     self.counter_write_hit = 0
     self.counter_write_miss = 0
 
+    # auxiliary structures, probed on primary read misses only
+    self.aux = []
+    self.counter_aux_hits = 0
+
     if self.debug:
       print("--- Cache Details ---")
       print("# Sets: ", self.sets)
@@ -99,6 +571,10 @@ class CACHE:
 
     return tag, index, offset
 
+  def block_address(self, tag, index):
+    """Rebuilds a block address from its tag and index."""
+    return (tag << (self.tag_shift - self.set_shift)) | index
+
   def write(self, address, data):
     """Writes a byte to a cache address.
 
@@ -126,8 +602,11 @@ class CACHE:
         self.counter_write_hit += 1
 
     # read block into cache from memory at address
-    for i in range(0, self.block_size-offset):
-      self.cache_data[index][offset+i] = self.memory[index+offset+i]
+    if self.profiler is None:
+      for i in range(0, self.block_size-offset):
+        self.cache_data[index][offset+i] = self.memory[index+offset+i]
+    else:
+      self.fill_block(index, offset)
 
     # set dirty bit
     self.dirty_bits[index] = 1
@@ -157,28 +636,50 @@ class CACHE:
       else:
         if self.debug:
           print("Read: {} = Miss".format(hex(address)))
-        self.valid_bits[index] = 1
-        self.cache[index] = tag
+        self.replace_line(address, tag, index)
         self.counter_read_miss += 1
     else:
       if self.debug:
         print("Read: {} = Miss".format(hex(address)))
-      self.valid_bits[index] = 1
-      self.cache[index] = tag
+      self.replace_line(address, tag, index)
       self.counter_read_miss += 1
 
     # pull block_size blocks from physical memory into cache
+    if self.profiler is None:
+      for i in range(0, self.block_size - offset):
+        try:
+          self.cache_data[index][offset+i] = self.memory[index+offset+i]
+        except:
+          print("Buffer Overflow - Not enough memory, more cache memory than main memory?")
+          pass
+    else:
+      self.fill_block(index, offset)
+    # increment the total counter reads
+    self.counter_reads += 1
+
+    # return data at address
+    return self.cache_data[index][offset]
+
+  def replace_line(self, address, tag, index):
+    """Replaces the line at index with tag after a read miss."""
+    if self.aux:
+      self.probe_aux(address >> self.set_shift)
+      if self.valid_bits[index] == 1:
+        self.evict_aux(self.block_address(self.cache[index], index))
+    self.valid_bits[index] = 1
+    self.cache[index] = tag
+
+  def fill_block(self, index, offset):
+    """Pulls the rest of the block from physical memory into the line at index.
+    read() and write() run this loop inline unless a profiler is attached,
+    which keeps a method call off every unprofiled access.
+    """
     for i in range(0, self.block_size - offset):
       try:
         self.cache_data[index][offset+i] = self.memory[index+offset+i]
       except:
         print("Buffer Overflow - Not enough memory, more cache memory than main memory?")
         pass
-    # increment the total counter reads
-    self.counter_reads += 1
-
-    # return data at address
-    return self.cache_data[index][offset]
 
   def flush_cache(self):
     """Flushes cache data."""
@@ -213,8 +714,248 @@ class CACHE:
     ])
 
 
+class SET_ASSOC_CACHE(BASE_CACHE):
+  def __init__(self, addr_width, cache_size, block_size, assoc = 1, replacement='LRU',
+               is_debug=True, ctx=None, sector_size=None, memory_size=1 << 16):
+    """Creates a set-associative cache with any number of sets and ways.
+    Addresses are split with divmod instead of bit shifts, so geometries such
+    as 12-way or 48 KiB slices work. Data lives in backing memory; the cache
+    models tags, per-sector valid/dirty bits and the memory traffic they cause.
+    :param int addr_width: Address width, in bits.
+    :param int cache_size: Size of cache object, in bytes.
+    :param int block_size: Size of memory block (line) in cache, in bytes.
+    :param int assoc: Associativity (ways per set).
+    :param str replacement: Cache replacement policy, 'LRU' or 'random'.
+    :param bool is_debug: Debugging enabled?
+    :param RUN_CONTEXT ctx: Seeds memory contents and replacement, new seed if None.
+    :param int sector_size: Bytes fetched per miss, block_size if None.
+    :param int memory_size: Size of backing memory, addresses wrap around it.
+
+    """
+    if sector_size is None:
+      sector_size = block_size
+    if cache_size % (block_size * assoc):
+      raise ValueError("cache size must be a multiple of block size * associativity")
+    if block_size % sector_size:
+      raise ValueError("block size must be a multiple of sector size")
+
+    self.debug = is_debug
+    self.ctx = ctx if ctx is not None else RUN_CONTEXT()
+    self.addr_width = addr_width
+    self.size = cache_size
+    self.block_size = block_size
+    self.assoc = assoc
+    self.replacement = replacement
+    self.sector_size = sector_size
+    self.sectors = block_size // sector_size
+    self.sets = cache_size // (block_size * assoc)
+
+    self.memory = self.ctx.memory_bytes(memory_size)
+    self.rng = self.ctx.stream('replacement', 'lines')
+
+    # per set: tag -> [valid sector mask, dirty sector mask], least recently used first
+    self.lines = [OrderedDict() for x in range(0, self.sets)]
+
+    # counters
+    self.counter_reads = 0
+    self.counter_read_hit = 0
+    self.counter_read_miss = 0
+
+    self.counter_writes = 0
+    self.counter_write_hit = 0
+    self.counter_write_miss = 0
+
+    # tag matched but the demanded sector was not valid (included in misses)
+    self.counter_sector_misses = 0
+    self.counter_bytes_fetched = 0
+    self.counter_bytes_written_back = 0
+
+    # auxiliary structures, probed on primary read misses only
+    self.aux = []
+    self.counter_aux_hits = 0
+
+    if self.debug:
+      print("--- Cache Details ---")
+      print("# Sets: ", self.sets)
+      print("Ways: ", self.assoc)
+      print("Sectors / Line: ", self.sectors)
+      print("----------------------")
+
+  def split_tio(self, address):
+    """Breaks down address into tag, index, offset.
+    Returns: tag, index, offset
+    """
+    block, offset = divmod(address, self.block_size)
+    tag, index = divmod(block, self.sets)
+    if self.debug:
+      print("Tag: {}\nIndex: {}\nOffset: {}".format(tag, index, offset))
+    return tag, index, offset
+
+  def access(self, address, is_write):
+    """Looks up address, fetching only the demanded sector on a miss.
+    Returns True on a hit.
+    """
+    tag, index, offset = self.split_tio(address)
+    sector = 1 << (offset // self.sector_size)
+    lines = self.lines[index]
+
+    line = lines.get(tag)
+    if line is None:
+      line, victim = self.replace_line(address, tag, index)
+      hit = False
+      if self.aux:
+        if not is_write and self.probe_aux(tag * self.sets + index):
+          # served by an auxiliary structure, not by memory
+          line[0] |= sector
+        if victim is not None:
+          self.evict_aux(victim)
+    elif line[0] & sector:
+      hit = True
+    else:
+      hit = False
+      self.counter_sector_misses += 1
+
+    if not line[0] & sector:
+      self.fill_block(line, sector)
+    lines.move_to_end(tag)
+    if is_write:
+      line[1] |= sector
+    return hit
+
+  def replace_line(self, address, tag, index):
+    """Allocates a line for tag in set index, evicting one if the set is full.
+    Returns: the new line, evicted block address or None
+    """
+    lines = self.lines[index]
+    victim = None
+    if len(lines) >= self.assoc:
+      if self.replacement == 'random':
+        old = self.rng.choice(list(lines))
+      else:
+        old = next(iter(lines))
+      valid, dirty = lines.pop(old)
+      self.counter_bytes_written_back += bin(dirty).count('1') * self.sector_size
+      victim = old * self.sets + index
+    line = lines[tag] = [0, 0]
+    return line, victim
+
+  def fill_block(self, line, sector):
+    """Fetches one sector of a line from memory."""
+    line[0] |= sector
+    self.counter_bytes_fetched += self.sector_size
+
+  def write(self, address, data):
+    """Writes a byte to a cache address (write-back, write-allocate)."""
+    self.counter_writes += 1
+    hit = self.access(address, True)
+    if hit:
+      self.counter_write_hit += 1
+    else:
+      self.counter_write_miss += 1
+    if self.debug:
+      print("Write: {} = {}".format(hex(address), "Hit" if hit else "Miss"))
+    self.memory[address % len(self.memory)] = data
+    return data
+
+  def read(self, address):
+    """Reads an address from the cache.
+    Returns data from address.
+    :param int address: Cache address.
+
+    """
+    self.counter_reads += 1
+    hit = self.access(address, False)
+    if hit:
+      self.counter_read_hit += 1
+    else:
+      self.counter_read_miss += 1
+    if self.debug:
+      print("Read: {} = {}".format(hex(address), "Hit" if hit else "Miss"))
+    return self.memory[address % len(self.memory)]
+
+  def flush_cache(self):
+    """Writes back dirty sectors and invalidates every line."""
+    for lines in self.lines:
+      for valid, dirty in lines.values():
+        self.counter_bytes_written_back += bin(dirty).count('1') * self.sector_size
+      lines.clear()
+
+  def print_cache(self):
+    """Displays tags and sector valid/dirty bits of every set"""
+    print("------CACHE-----")
+    print("[set] tag: valid dirty")
+    print("----------------")
+    for i, lines in enumerate(self.lines):
+      for tag, (valid, dirty) in lines.items():
+        print("[{}] {}: {:0{w}b} {:0{w}b}".format(hex(i), hex(tag), valid, dirty, w=self.sectors))
+    print("----------------")
+
+  def cache_stats(self):
+    """Cache counter statistics, CACHE's columns followed by geometry and traffic."""
+    return ([
+      self.size, self.block_size,
+      self.counter_reads, self.counter_writes,
+      self.counter_read_hit, self.counter_read_miss,
+      self.counter_write_hit, self.counter_write_miss,
+      self.assoc, self.sets, self.sector_size, self.counter_sector_misses,
+      self.counter_bytes_fetched, self.counter_bytes_written_back
+    ])
+
+
+class SECTORED_CACHE(SET_ASSOC_CACHE):
+  def __init__(self, addr_width, cache_size, block_size, sector_size, assoc = 1,
+               replacement='LRU', is_debug=True, ctx=None, memory_size=1 << 16):
+    """Creates a sectored cache: one tag per block_size line, with a valid and
+    dirty bit per sector_size sector. A miss fetches only the demanded sector.
+    :param int sector_size: Size of a sector, in bytes.
+
+    See SET_ASSOC_CACHE for the remaining parameters.
+    """
+    super().__init__(addr_width, cache_size, block_size, assoc, replacement,
+                     is_debug, ctx, sector_size, memory_size)
+
+
 ### "Simulator" ###
-def main():
+def run_experiment(args):
+  """Simulates one cache geometry on the random-read workload.
+  Returns a result row carrying the seeds, configuration, trace fingerprint
+  and simulator version needed to reproduce it.
+  :param tuple args: (master seed, addr_width, cache_size, block_size,
+    profiler sample_every or 0 for no profiling).
+
+  """
+  seed, addr_width, cache_size, block_size, sample_every = args
+  ctx = RUN_CONTEXT(seed).spawn(cache_size, block_size)
+  workload = ctx.stream('workload')
+  config = {
+    'addr_width': addr_width, 'cache_size': cache_size,
+    'block_size': block_size, 'assoc': 1, 'replacement': 'LRU',
+    'workload': 'rand5k', 'accesses': 10000,
+  }
+
+  myCache = CACHE(addr_width, cache_size, block_size, 1, is_debug=False, ctx=ctx)
+  if sample_every:
+    myCache.enable_profiler(SIM_PROFILER(sample_every, snapshot_every=2000))
+
+  for i in range(0, 10000):
+    # address = i # read sequentially
+    address = workload.randint(0,5000) # read randomly
+    ctx.record(address)
+    data = myCache.read(address)
+    ctx.record(i)
+    myCache.write(i, data)
+
+  if sample_every:
+    name = 'profile_{}_{}'.format(cache_size, block_size)
+    myCache.profiler.dump_stats(name + '.prof')
+    myCache.profiler.write_timeline(name + '.json')
+
+  return myCache.cache_stats() + [
+    seed, ctx.seed, json.dumps(config, sort_keys=True),
+    ctx.fingerprint(), __version__
+  ]
+
+def main(seed=0, workers=1, sample_every=0):
   # -- cache parameters --- #
   addr_width = 4
   cache_sizes = [4 * 1024, 8 * 1024, 16 * 1024, 32 * 1024, 64 * 1024]
@@ -227,24 +968,186 @@ def main():
     'cache_size', 'block_size',
     'total_reads', 'total_writes',
     'read_hits', 'read_misses',
-    'write_hits', 'write_misses'
+    'write_hits', 'write_misses',
+    'seed', 'run_seed', 'config', 'trace_fingerprint', 'sim_version'
+  ])
+
+  # result I/O is profiled here, simulation phases inside each worker
+  profiler = SIM_PROFILER() if sample_every else None
+  def write_row(stats):
+    if profiler is None:
+      writer.writerow(stats)
+    else:
+      with profiler.phase('result_io'):
+        writer.writerow(stats)
+
+  # cache operations, each config seeded from (seed, cache_size, block_size)
+  jobs = [(seed, addr_width, cache_size, block_size, sample_every)
+          for cache_size in cache_sizes for block_size in block_sizes]
+  if workers > 1:
+    with multiprocessing.Pool(workers) as pool:
+      rows = pool.imap(run_experiment, jobs)
+      for job, stats in zip(jobs, rows):
+        write_row(stats)
+        if job[3] == block_sizes[-1]:
+          print("done with cache: ",job[2])
+  else:
+    for job in jobs:
+      write_row(run_experiment(job))
+      if job[3] == block_sizes[-1]:
+        print("done with cache: ",job[2])
+  f.close()
+
+  if profiler is not None:
+    profiler.dump_stats('profile_main.prof')
+    profiler.write_timeline('profile_main.json')
+
+def aux_main(seed=0):
+  # -- cache parameters --- #
+  addr_width = 4
+  # small enough that the 0-5000 random reads conflict
+  cache_sizes = [1 * 1024, 2 * 1024, 4 * 1024]
+  block_size = 16
+  # (organisation, ways, aux, aux entries): aux structures on the direct-mapped
+  # CACHE and SET_ASSOC_CACHE, against plain 2/4/8-way SET_ASSOC_CACHE baselines
+  configs = [
+    ('CACHE', 1, 'none', 0),
+    ('CACHE', 1, 'victim', 4), ('CACHE', 1, 'victim', 8), ('CACHE', 1, 'victim', 16),
+    ('CACHE', 1, 'miss', 4), ('CACHE', 1, 'miss', 8), ('CACHE', 1, 'miss', 16),
+    ('CACHE', 1, 'stream', 4),
+    ('SET_ASSOC_CACHE', 1, 'none', 0),
+    ('SET_ASSOC_CACHE', 1, 'victim', 4), ('SET_ASSOC_CACHE', 1, 'victim', 8),
+    ('SET_ASSOC_CACHE', 1, 'victim', 16),
+    ('SET_ASSOC_CACHE', 2, 'none', 0), ('SET_ASSOC_CACHE', 4, 'none', 0),
+    ('SET_ASSOC_CACHE', 8, 'none', 0),
+  ]
+
+  # -- used to keep track of experiments -- #
+  f = open('results_aux.csv', 'w')
+  writer = csv.writer(f)
+  writer.writerow([
+    'cache_size', 'block_size', 'organisation', 'assoc', 'aux', 'aux_entries',
+    'read_misses', 'aux_hits', 'effective_read_misses', 'prefetches',
+    'seed', 'run_seed', 'config', 'trace_fingerprint', 'sim_version'
   ])
 
-  # cache operations
   for cache_size in cache_sizes:
-    for block_size in block_sizes:
-      myCache = CACHE(addr_width, cache_size, block_size, 1, is_debug=False)
+    for organisation, assoc, kind, entries in configs:
+      # same workload and memory for every config of a cache size
+      ctx = RUN_CONTEXT(seed).spawn(cache_size, block_size)
+      workload = ctx.stream('workload')
+      config = {
+        'addr_width': addr_width, 'cache_size': cache_size,
+        'block_size': block_size, 'organisation': organisation, 'assoc': assoc,
+        'replacement': 'LRU', 'aux': kind, 'aux_entries': entries,
+        'workload': 'rand5k', 'accesses': 10000,
+      }
+      if organisation == 'CACHE':
+        myCache = CACHE(addr_width, cache_size, block_size, 1, is_debug=False, ctx=ctx)
+      else:
+        myCache = SET_ASSOC_CACHE(addr_width, cache_size, block_size, assoc,
+                                  is_debug=False, ctx=ctx)
+      if kind == 'victim':
+        myCache.attach(VICTIM_CACHE(entries))
+      elif kind == 'miss':
+        myCache.attach(MISS_CACHE(entries))
+      elif kind == 'stream':
+        myCache.attach(STREAM_BUFFER(1, entries))
 
       for i in range(0, 10000):
-        # data = myCache.read(i) # read sequentially
-        data = myCache.read(random.randint(0,5000)) # read randomly
+        address = workload.randint(0,5000) # read randomly
+        ctx.record(address)
+        data = myCache.read(address)
+        ctx.record(i)
         myCache.write(i, data)
 
-      stats = myCache.cache_stats()
-      writer.writerow(stats)
+      prefetches = sum(row[5] for row in myCache.aux_stats())
+      writer.writerow([
+        cache_size, block_size, organisation, assoc, kind, entries,
+        myCache.counter_read_miss, myCache.counter_aux_hits,
+        myCache.counter_read_miss - myCache.counter_aux_hits, prefetches,
+        seed, ctx.seed, json.dumps(config, sort_keys=True),
+        ctx.fingerprint(), __version__
+      ])
     print("done with cache: ",cache_size)
+  f.close()
+
+def sector_main(seed=0):
+  # -- cache parameters --- #
+  addr_width = 4
+  # (cache size, ways); 48 KiB direct-mapped and 4-way have 3 * 2^k sets,
+  # the 12-way 48 KiB slice has a power-of-two set count but 12 ways
+  geometries = [
+    (16 * 1024, 1), (16 * 1024, 4),
+    (48 * 1024, 1), (48 * 1024, 4), (48 * 1024, 12),
+  ]
+  block_sizes = [4, 8, 16, 32, 64, 128, 256]
+  sector_size = 4
+
+  # -- used to keep track of experiments -- #
+  f = open('results_sectored.csv', 'w')
+  writer = csv.writer(f)
+  writer.writerow([
+    'cache_size', 'block_size',
+    'total_reads', 'total_writes',
+    'read_hits', 'read_misses',
+    'write_hits', 'write_misses',
+    'assoc', 'sets', 'sector_size', 'sector_misses',
+    'bytes_fetched', 'bytes_written_back',
+    'seed', 'run_seed', 'config', 'trace_fingerprint', 'sim_version'
+  ])
+
+  for cache_size, assoc in geometries:
+    for block_size in block_sizes:
+      # conventional lines, then sectored lines on the same workload
+      for sector in sorted({block_size, min(sector_size, block_size)}, reverse=True):
+        ctx = RUN_CONTEXT(seed).spawn(cache_size, block_size)
+        workload = ctx.stream('workload')
+        if sector < block_size:
+          organisation = 'SECTORED_CACHE'
+          myCache = SECTORED_CACHE(addr_width, cache_size, block_size, sector, assoc,
+                                   is_debug=False, ctx=ctx)
+        else:
+          organisation = 'SET_ASSOC_CACHE'
+          myCache = SET_ASSOC_CACHE(addr_width, cache_size, block_size, assoc,
+                                    is_debug=False, ctx=ctx)
+        config = {
+          'addr_width': addr_width, 'cache_size': cache_size,
+          'block_size': block_size, 'organisation': organisation,
+          'assoc': assoc, 'replacement': 'LRU', 'sector_size': sector,
+          'workload': 'rand5k', 'accesses': 10000,
+        }
+
+        for i in range(0, 10000):
+          address = workload.randint(0,5000) # read randomly
+          ctx.record(address)
+          data = myCache.read(address)
+          ctx.record(i)
+          myCache.write(i, data)
+        myCache.flush_cache()
+
+        writer.writerow(myCache.cache_stats() + [
+          seed, ctx.seed, json.dumps(config, sort_keys=True),
+          ctx.fingerprint(), __version__
+        ])
+    print("done with cache: ",cache_size, assoc)
+  f.close()
+
 if __name__ == '__main__':
-  main()
+  parser = argparse.ArgumentParser(description='Direct-mapped cache simulator sweep.')
+  parser.add_argument('--sweep', choices=['main', 'aux', 'sectored'], default='main',
+                      help='block size grid, aux structures vs associativity, or sectored lines')
+  parser.add_argument('--seed', type=int, default=0, help='master seed')
+  parser.add_argument('--workers', type=int, default=1, help='parallel sweep workers')
+  parser.add_argument('--profile', type=int, default=0, metavar='N',
+                      help='time one access in N and write profile_*.prof/json (0 = off)')
+  args = parser.parse_args()
+  if args.sweep == 'aux':
+    aux_main(args.seed)
+  elif args.sweep == 'sectored':
+    sector_main(args.seed)
+  else:
+    main(args.seed, args.workers, args.profile)
 
   # dump data from cache
   # myCache.print_cache()
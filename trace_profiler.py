@@ -0,0 +1,469 @@
+#  ECE562 Semester Project
+#  Trace Profiler - reuse distance, working set and locality of a trace
+#  Brent Rubell and Christian Ellis
+
+import argparse
+import csv
+import heapq
+import math
+import random
+from collections import Counter, deque
+
+from cache import RUN_CONTEXT
+
+MASK64 = (1 << 64) - 1
+
+
+def hash64(value):
+  """Mixes an integer into a well distributed 64-bit hash (splitmix64).
+  :param int value: Value to hash.
+
+  """
+  x = (value + 0x9E3779B97F4A7C15) & MASK64
+  x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+  x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+  return x ^ (x >> 31)
+
+
+class HYPERLOGLOG:
+  def __init__(self, precision=12):
+    """Creates a HyperLogLog distinct-value counter.
+    Memory is 2**precision bytes regardless of how many values are added.
+    :param int precision: Number of hash bits used to pick a register.
+
+    """
+    self.precision = precision
+    self.m = 1 << precision
+    self.registers = bytearray(self.m)
+    self.alpha = 0.7213 / (1 + 1.079 / self.m)
+
+  def add_hash(self, h):
+    """Adds an already hashed 64-bit value."""
+    index = h >> (64 - self.precision)
+    rest = (h << self.precision) & MASK64
+    if rest == 0:
+      rank = 64 - self.precision + 1
+    else:
+      rank = 65 - rest.bit_length()
+    if rank > self.registers[index]:
+      self.registers[index] = rank
+
+  def add(self, value):
+    """Adds an integer value."""
+    self.add_hash(hash64(value))
+
+  def estimate(self):
+    """Returns the estimated number of distinct values added."""
+    total = 0.0
+    zeros = 0
+    for r in self.registers:
+      total += 2.0 ** -r
+      if r == 0:
+        zeros += 1
+    est = self.alpha * self.m * self.m / total
+    # small range correction (linear counting)
+    if est <= 2.5 * self.m and zeros:
+      est = self.m * math.log(self.m / zeros)
+    return int(round(est))
+
+  def reset(self):
+    """Clears all registers."""
+    self.registers = bytearray(self.m)
+
+
+class FENWICK:
+  def __init__(self, size):
+    """Creates a Fenwick (binary indexed) tree of size counters, all zero.
+    :param int size: Number of positions.
+
+    """
+    self.size = size
+    self.tree = [0] * (size + 1)
+
+  def add(self, pos, delta):
+    """Adds delta to the counter at pos."""
+    pos += 1
+    while pos <= self.size:
+      self.tree[pos] += delta
+      pos += pos & -pos
+
+  def prefix(self, pos):
+    """Sum of the counters at positions [0, pos)."""
+    total = 0
+    while pos > 0:
+      total += self.tree[pos]
+      pos -= pos & -pos
+    return total
+
+
+class REUSE_SAMPLER:
+  def __init__(self, max_samples=4096):
+    """Creates a fixed-size spatially sampled reuse-distance tracker (SHARDS).
+    A block is tracked only if its hash falls under a threshold; whenever more
+    than max_samples blocks are tracked the threshold is lowered, so memory is
+    bounded no matter how long the trace is. Each sampled access costs
+    O(log max_samples).
+    :param int max_samples: Maximum number of blocks tracked at once.
+
+    """
+    self.max_samples = max_samples
+    self.threshold = MASK64 + 1
+    # sampled block -> logical time of its last access
+    self.last = {}
+    # one mark per tracked block at its last access time; the reuse distance
+    # is the number of marks after the block's own
+    self.capacity = 4 * max_samples + 4
+    self.marks = FENWICK(self.capacity)
+    self.clock = 0
+    # max-heap of (-hash, block) over tracked blocks, to lower the threshold
+    self.heap = []
+    # log2 buckets of reuse distance, weighted by 1 / sampling rate
+    self.histogram = [0.0] * 65
+    self.cold = 0.0
+    self.total = 0.0
+
+  def rate(self):
+    """Current sampling rate."""
+    return self.threshold / (MASK64 + 1)
+
+  def access(self, block, h):
+    """Records an access to block, whose hash64 is h."""
+    if h >= self.threshold:
+      return
+    weight = 1.0 / self.rate()
+    self.total += weight
+    if self.clock == self.capacity:
+      self._compact()
+    last = self.last.get(block)
+    if last is not None:
+      # distinct sampled blocks touched since the last access to block
+      distance = len(self.last) - self.marks.prefix(last + 1)
+      self.marks.add(last, -1)
+      self.histogram[int(distance * weight).bit_length()] += weight
+    else:
+      self.cold += weight
+      heapq.heappush(self.heap, (-h, block))
+
+    self.last[block] = self.clock
+    self.marks.add(self.clock, 1)
+    self.clock += 1
+
+    if len(self.last) > self.max_samples:
+      self._lower_threshold()
+
+  def _lower_threshold(self):
+    """Drops the block with the largest hash and samples below it from now on."""
+    neg_h, victim = heapq.heappop(self.heap)
+    self.threshold = -neg_h
+    self.marks.add(self.last.pop(victim), -1)
+
+  def _compact(self):
+    """Renumbers last-access times 0..n-1 once the clock reaches capacity.
+    At most max_samples + 1 blocks are live, so this runs at most once every
+    3 * max_samples accesses and costs O(log max_samples) amortised.
+    """
+    self.marks = FENWICK(self.capacity)
+    for time, block in enumerate(sorted(self.last, key=self.last.get)):
+      self.last[block] = time
+      self.marks.add(time, 1)
+    self.clock = len(self.last)
+
+  def miss_ratio(self, lines):
+    """Estimated miss ratio of a fully-associative LRU cache.
+    :param int lines: Number of lines in the cache.
+
+    """
+    if self.total == 0:
+      return 0.0
+    misses = self.cold
+    for bucket, count in enumerate(self.histogram):
+      if count == 0:
+        continue
+      # bucket b holds distances in [2**(b-1), 2**b), bucket 0 holds 0
+      low = 0 if bucket == 0 else 1 << (bucket - 1)
+      high = 1 if bucket == 0 else 1 << bucket
+      if lines <= low:
+        misses += count
+      elif lines < high:
+        misses += count * (high - lines) / (high - low)
+    return min(1.0, misses / self.total)
+
+
+class TRACE_PROFILER:
+  def __init__(self, block_sizes, max_samples=4096, window=100000,
+               max_windows=1024, max_strides=256, precision=12):
+    """Creates a single-pass, bounded-memory trace profiler.
+    :param list block_sizes: Block sizes to characterise, in bytes.
+    :param int max_samples: Reuse-distance samples tracked per block size.
+    :param int window: Accesses per working-set window.
+    :param int max_windows: Number of recent working-set windows kept.
+    :param int max_strides: Distinct strides counted before lumping into other.
+    :param int precision: HyperLogLog precision.
+
+    """
+    self.block_sizes = sorted(block_sizes)
+    self.window = window
+    self.max_strides = max_strides
+
+    self.samplers = {b: REUSE_SAMPLER(max_samples) for b in self.block_sizes}
+    self.footprints = {b: HYPERLOGLOG(precision) for b in self.block_sizes}
+    self.last_block = {b: None for b in self.block_sizes}
+    self.same_block = {b: 0 for b in self.block_sizes}
+
+    # working set over time windows, at the smallest block size
+    self.window_hll = HYPERLOGLOG(min(precision, 10))
+    self.windows = deque(maxlen=max_windows)
+    self.window_min = None
+    self.window_max = 0
+    self.window_sum = 0
+    self.window_count = 0
+
+    self.strides = Counter()
+    self.strides_other = 0
+    self.last_address = None
+
+    # counters
+    self.counter_accesses = 0
+
+  def access(self, address):
+    """Feeds one address of the trace into the profiler.
+    :param int address: Byte address.
+
+    """
+    self.counter_accesses += 1
+
+    for b in self.block_sizes:
+      block = address // b
+      h = hash64(block)
+      self.samplers[b].access(block, h)
+      self.footprints[b].add_hash(h)
+      if block == self.last_block[b]:
+        self.same_block[b] += 1
+      self.last_block[b] = block
+      if b == self.block_sizes[0]:
+        self.window_hll.add_hash(h)
+
+    if self.last_address is not None:
+      stride = address - self.last_address
+      if stride in self.strides or len(self.strides) < self.max_strides:
+        self.strides[stride] += 1
+      else:
+        self.strides_other += 1
+    self.last_address = address
+
+    if self.counter_accesses % self.window == 0:
+      self._close_window()
+
+  def profile(self, trace):
+    """Streams a whole trace through the profiler.
+    :param trace: Iterable of byte addresses.
+
+    """
+    for address in trace:
+      self.access(address)
+    if self.counter_accesses % self.window:
+      self._close_window()
+    return self
+
+  def _close_window(self):
+    """Records the working set of the window that just ended."""
+    size = self.window_hll.estimate()
+    self.windows.append((self.counter_accesses, size))
+    self.window_hll.reset()
+    self.window_count += 1
+    self.window_sum += size
+    self.window_max = max(self.window_max, size)
+    if self.window_min is None or size < self.window_min:
+      self.window_min = size
+
+  # reports
+  def miss_ratio_curve(self, cache_sizes):
+    """Estimated miss ratio for every cache size and block size.
+    Returns: list of [cache_size, block_size, lines, miss_ratio] rows
+    """
+    rows = []
+    for cache_size in cache_sizes:
+      for b in self.block_sizes:
+        lines = cache_size // b
+        if lines == 0:
+          continue
+        rows.append([cache_size, b, lines, self.samplers[b].miss_ratio(lines)])
+    return rows
+
+  def spatial_locality(self):
+    """Per block size: same-block rate, unique blocks and byte utilisation.
+    Utilisation is the fraction of each fetched block that the trace touches.
+    Returns: list of [block_size, same_block_rate, unique_blocks, utilisation]
+    """
+    rows = []
+    smallest = self.block_sizes[0]
+    touched = self.footprints[smallest].estimate() * smallest
+    for b in self.block_sizes:
+      unique = self.footprints[b].estimate()
+      same = self.same_block[b] / self.counter_accesses if self.counter_accesses else 0.0
+      util = min(1.0, touched / (unique * b)) if unique else 0.0
+      rows.append([b, same, unique, util])
+    return rows
+
+  def working_set(self):
+    """Working-set size summary, in blocks of the smallest block size."""
+    mean = self.window_sum / self.window_count if self.window_count else 0
+    return {
+      'window': self.window,
+      'windows': self.window_count,
+      'min': self.window_min or 0,
+      'mean': mean,
+      'max': self.window_max,
+      'recent': list(self.windows),
+    }
+
+  def top_strides(self, n=10):
+    """Most common strides between consecutive addresses.
+    Returns: list of (stride, fraction) pairs
+    """
+    total = sum(self.strides.values()) + self.strides_other
+    if total == 0:
+      return []
+    return [(s, c / total) for s, c in self.strides.most_common(n)]
+
+  def recommend(self, cache_sizes, tolerance=0.1):
+    """Recommends a block size per cache size and the smallest adequate cache.
+    The recommended cache is the smallest whose best miss ratio is within
+    tolerance (relative) of the best miss ratio at the largest cache size.
+    :param list cache_sizes: Candidate cache sizes, in bytes.
+    :param float tolerance: Allowed relative miss-ratio loss.
+
+    """
+    best = {}
+    for cache_size, b, lines, ratio in self.miss_ratio_curve(cache_sizes):
+      if cache_size not in best or ratio < best[cache_size][1]:
+        best[cache_size] = (b, ratio)
+    if not best:
+      return {'per_size': {}, 'cache_size': None, 'block_size': None}
+    floor = best[max(best)][1]
+    for cache_size in sorted(best):
+      if best[cache_size][1] <= floor * (1 + tolerance) + 1e-9:
+        break
+    return {
+      'per_size': best,
+      'cache_size': cache_size,
+      'block_size': best[cache_size][0],
+    }
+
+  def write_report(self, path, cache_sizes):
+    """Writes the miss-ratio curve and per-block-size locality as a CSV."""
+    locality = {row[0]: row for row in self.spatial_locality()}
+    with open(path, 'w', newline='') as f:
+      writer = csv.writer(f)
+      writer.writerow([
+        'cache_size', 'block_size', 'lines', 'est_miss_ratio',
+        'same_block_rate', 'unique_blocks', 'block_utilisation'
+      ])
+      for row in self.miss_ratio_curve(cache_sizes):
+        writer.writerow(row + locality[row[1]][1:])
+
+  def print_report(self, cache_sizes):
+    """Displays a summary of the profile."""
+    print("--- Trace Profile ---")
+    print("Accesses: ", self.counter_accesses)
+    print("Unique Blocks:")
+    for b, same, unique, util in self.spatial_locality():
+      print("  {:>5} B: {:>10} blocks, same-block {:.3f}, util {:.3f}".format(
+        b, unique, same, util))
+    ws = self.working_set()
+    print("Working Set ({} accesses/window): min {} mean {:.0f} max {}".format(
+      ws['window'], ws['min'], ws['mean'], ws['max']))
+    print("Top Strides:")
+    for stride, frac in self.top_strides(5):
+      print("  {:>8}: {:.3f}".format(stride, frac))
+    rec = self.recommend(cache_sizes)
+    print("Recommended Geometry:")
+    for cache_size, (b, ratio) in sorted(rec['per_size'].items()):
+      print("  {:>6} B cache: block {:>4} B, est. miss ratio {:.3f}".format(
+        cache_size, b, ratio))
+    print("Smallest adequate cache: {} B with {} B blocks".format(
+      rec['cache_size'], rec['block_size']))
+    print("----------------------")
+
+
+# first field of Dinero ("0 1000") and lackey ("L 04222cac,4") lines; both
+# formats write addresses in hex without a 0x prefix
+HEX_TRACE_LABELS = {'0', '1', '2', '3', '4', 'I', 'L', 'S', 'M'}
+
+
+def read_trace(path, is_hex=False):
+  """Streams addresses from a trace file, one access per line.
+  The address is the last field on the line, with any ",size" suffix dropped.
+  Blank lines and lines starting with # or == are skipped.
+  0x-prefixed addresses are always hex. Otherwise addresses are decimal,
+  unless is_hex is set. Dinero ("0 1000") and lackey ("L 04222cac,4") lines
+  use unprefixed hex, so they raise unless is_hex is set, rather than being
+  misread as decimal.
+  :param str path: Trace file.
+  :param bool is_hex: Unprefixed addresses are hex.
+
+  """
+  with open(path) as f:
+    for num, line in enumerate(f, 1):
+      line = line.strip()
+      if not line or line.startswith('#') or line.startswith('=='):
+        continue
+      fields = line.split()
+      field = fields[-1].split(',')[0]
+      if field[:2].lower() == '0x':
+        base = 16
+      elif is_hex:
+        base = 16
+      elif len(fields) > 1 and fields[0] in HEX_TRACE_LABELS:
+        raise ValueError("{}:{}: Dinero/lackey addresses are hex, pass --hex".format(
+          path, num))
+      else:
+        base = 10
+      try:
+        yield int(field, base)
+      except ValueError:
+        raise ValueError("{}:{}: bad {} address {!r}".format(
+          path, num, 'hex' if base == 16 else 'decimal', field)) from None
+
+
+def random_trace(accesses=10000, high=5000, rng=None):
+  """Generates the random read / sequential write workload of cache.main().
+  :param random.Random rng: Workload stream. To reproduce one main() config,
+    pass RUN_CONTEXT(seed).spawn(cache_size, block_size).stream('workload').
+    Defaults to random.Random(0), which matches no particular config.
+
+  """
+  if rng is None:
+    rng = random.Random(0)
+  for i in range(0, accesses):
+    yield rng.randint(0, high)
+    yield i
+
+
+### "Profiler" ###
+def main():
+  # -- same grid as the simulator -- #
+  cache_sizes = [4 * 1024, 8 * 1024, 16 * 1024, 32 * 1024, 64 * 1024]
+  block_sizes = [4, 8, 16, 32, 64, 128, 256]
+
+  parser = argparse.ArgumentParser(description='Profile the locality of a trace.')
+  parser.add_argument('trace', nargs='?', help='trace file, default: cache.main() workload')
+  parser.add_argument('--hex', action='store_true', help='addresses are unprefixed hex')
+  parser.add_argument('--seed', type=int, default=0, help='master seed of the workload')
+  parser.add_argument('--config', type=int, nargs=2, default=[4096, 4],
+                      metavar=('CACHE_SIZE', 'BLOCK_SIZE'),
+                      help='main() config whose workload stream to reproduce')
+  args = parser.parse_args()
+
+  if args.trace:
+    trace = read_trace(args.trace, args.hex)
+  else:
+    rng = RUN_CONTEXT(args.seed).spawn(*args.config).stream('workload')
+    trace = random_trace(rng=rng)
+
+  profiler = TRACE_PROFILER(block_sizes).profile(trace)
+  profiler.print_report(cache_sizes)
+  profiler.write_report('mrc.csv', cache_sizes)
+
+if __name__ == '__main__':
+  main()
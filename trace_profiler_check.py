@@ -0,0 +1,123 @@
+#  ECE562 Semester Project
+#  Trace Profiler Checks - sampler and HyperLogLog against exact answers
+#  Brent Rubell and Christian Ellis
+
+import os
+import random
+import tempfile
+from collections import OrderedDict
+
+from trace_profiler import HYPERLOGLOG, REUSE_SAMPLER, hash64, read_trace
+
+
+def lru_histogram(trace):
+  """Exact log2 reuse-distance histogram from a brute-force LRU stack."""
+  stack = []
+  histogram = [0.0] * 65
+  for block in trace:
+    if block in stack:
+      distance = len(stack) - 1 - stack.index(block)
+      stack.remove(block)
+      histogram[distance.bit_length()] += 1
+    stack.append(block)
+  return histogram
+
+
+def lru_miss_ratio(trace, lines):
+  """Exact miss ratio of a fully-associative LRU cache of lines blocks."""
+  cache = OrderedDict()
+  misses = 0
+  for block in trace:
+    if block in cache:
+      cache.move_to_end(block)
+    else:
+      misses += 1
+      cache[block] = None
+      if len(cache) > lines:
+        cache.popitem(last=False)
+  return misses / len(trace)
+
+
+def check_sampler_exact():
+  """With every block sampled the sampler must match an LRU stack exactly,
+  including after the last-access times have been compacted."""
+  rng = random.Random(1)
+  trace = [rng.randint(0, 3000) for x in range(0, 50000)]
+  # capacity 4 * 3001 + 4 < 50000, so _compact() runs several times
+  sampler = REUSE_SAMPLER(max_samples=3001)
+  for block in trace:
+    sampler.access(block, 0)
+  assert sampler.clock < len(trace), "compaction never ran"
+  assert sampler.histogram == lru_histogram(trace), "histogram differs from LRU stack"
+  for lines in (64, 512, 2048, 4096):
+    exact = lru_miss_ratio(trace, lines)
+    assert abs(sampler.miss_ratio(lines) - exact) < 1e-9, (lines, exact)
+  print("sampler exact: ok")
+
+
+def check_sampler_sampled(tolerance=0.05):
+  """With sampling forced on, the estimated miss ratio stays near the exact one."""
+  rng = random.Random(2)
+  # skewed reuse: a hot set plus a long tail
+  trace = [rng.randint(0, 255) if rng.random() < 0.7 else rng.randint(0, 20000)
+           for x in range(0, 100000)]
+  sampler = REUSE_SAMPLER(max_samples=512)
+  for block in trace:
+    sampler.access(block, hash64(block))
+  assert sampler.rate() < 1.0, "sampling never kicked in"
+  assert len(sampler.last) <= 512 and len(sampler.heap) == len(sampler.last)
+  for lines in (128, 1024, 8192):
+    exact = lru_miss_ratio(trace, lines)
+    est = sampler.miss_ratio(lines)
+    assert abs(est - exact) < tolerance, (lines, exact, est)
+    print("sampler {:>5} lines: exact {:.3f} est {:.3f}".format(lines, exact, est))
+  print("sampler sampled: ok")
+
+
+def check_hyperloglog():
+  """Estimates stay within 3 standard errors (1.04 / sqrt(m)) of the truth."""
+  for precision in (10, 12):
+    hll = HYPERLOGLOG(precision)
+    bound = 3 * 1.04 / (hll.m ** 0.5)
+    added = 0
+    for n in (100, 1000, 10000, 200000):
+      for value in range(added, n):
+        hll.add(value)
+      added = n
+      est = hll.estimate()
+      assert abs(est - n) / n < bound, (precision, n, est)
+  print("hyperloglog: ok")
+
+
+def check_read_trace():
+  """Address formats parse as documented, and ambiguous ones raise."""
+  cases = [
+    ("12\n0100\n0x1f\nW 7\n", False, [12, 100, 31, 7]),
+    ("0 1000\n1 7fff\n", True, [0x1000, 0x7fff]),
+    ("==1== lackey\nL 04222cac,4\n I  0400d7d4,8\n", True, [0x04222cac, 0x0400d7d4]),
+    ("0 1000\n", False, ValueError),
+    ("L 04222cac,4\n", False, ValueError),
+    ("1f\n", False, ValueError),
+  ]
+  for text, is_hex, expected in cases:
+    fd, path = tempfile.mkstemp()
+    with os.fdopen(fd, 'w') as f:
+      f.write(text)
+    try:
+      result = list(read_trace(path, is_hex))
+    except ValueError:
+      result = ValueError
+    finally:
+      os.remove(path)
+    assert result == expected, (text, is_hex, result)
+  print("read_trace: ok")
+
+
+def main():
+  check_sampler_exact()
+  check_sampler_sampled()
+  check_hyperloglog()
+  check_read_trace()
+
+if __name__ == '__main__':
+  main()